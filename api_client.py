@@ -1,20 +1,56 @@
 """External API client module"""
 
-import asyncio
 import logging
-from typing import Optional, Dict, Any
-from contextlib import asynccontextmanager
+import math
+import random
+from typing import Optional
 
-import aiohttp
+import httpx
+from aiolimiter import AsyncLimiter
 from tenacity import (
     retry,
     stop_after_attempt,
-    wait_exponential,
+    wait_exponential_jitter,
     retry_if_exception_type
 )
 
+from config import Config
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_RETRY_AFTER = 5.0
+MAX_RETRY_AFTER = 60.0
+
+
+class RateLimited(Exception):
+    """Raised when the API throttles a request (HTTP 429/503)"""
+    
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _parse_retry_after(value: Optional[str]) -> float:
+    """Parse a Retry-After header given in seconds, clamped to MAX_RETRY_AFTER"""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+    if not math.isfinite(seconds):
+        return DEFAULT_RETRY_AFTER
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+_backoff = wait_exponential_jitter(initial=2, max=10)
+
+
+def _wait_for_retry(retry_state) -> float:
+    """Honor Retry-After when throttled, otherwise back off with jitter"""
+    exc = retry_state.outcome.exception()
+    if isinstance(exc, RateLimited):
+        return exc.retry_after + random.uniform(0, 1)
+    return _backoff(retry_state)
+
 
 class ExternalAPIClient:
     """Handles external API requests with retry logic"""
@@ -22,59 +58,82 @@ class ExternalAPIClient:
     def __init__(self, base_url: str, api_key: str, timeout: int):
         self.base_url = base_url
         self.api_key = api_key
-        self.timeout = aiohttp.ClientTimeout(total=timeout)
-        self.session: Optional[aiohttp.ClientSession] = None
+        # httpx has no overall deadline; each phase gets the full budget
+        self.timeout = httpx.Timeout(
+            connect=timeout, read=timeout, write=timeout, pool=timeout
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.limiter = AsyncLimiter(max_rate=Config.REQUESTS_PER_SECOND, time_period=1)
     
-    @asynccontextmanager
-    async def get_session(self):
-        """Context manager for aiohttp session"""
-        if not self.session:
-            self.session = aiohttp.ClientSession(
-                timeout=self.timeout,
-                headers={"Authorization": f"Bearer {self.api_key}"}
+    async def start(self):
+        """Create the shared HTTP client (HTTP/2 when the server supports it)"""
+        if self._client:
+            return
+        self._client = httpx.AsyncClient(
+            http2=True,
+            follow_redirects=True,
+            timeout=self.timeout,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            limits=httpx.Limits(
+                max_connections=max(Config.CONNECTION_POOL_SIZE, Config.CONCURRENT_REQUESTS * 2),
+                max_keepalive_connections=Config.CONCURRENT_REQUESTS,
+                keepalive_expiry=75
             )
-        try:
-            yield self.session
-        finally:
-            pass
+        )
+        logger.info("API client session started")
+    
+    @property
+    def is_started(self) -> bool:
+        """Whether start() has created the HTTP client"""
+        return self._client is not None
     
     async def close(self):
-        """Close the aiohttp session"""
-        if self.session:
-            await self.session.close()
+        """Close the HTTP client"""
+        if self._client:
+            await self._client.aclose()
+            self._client = None
             logger.info("API client session closed")
     
     @retry(
         stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError))
+        wait=_wait_for_retry,
+        retry=retry_if_exception_type((httpx.HTTPError, RateLimited))
     )
-    async def get_user_info(self, user_id: str) -> Optional[Dict[str, Any]]:
+    async def get_user_raw(self, user_id: str) -> Optional[bytes]:
         """
-        Fetch user information from external API with retry logic
+        Fetch the raw user payload from external API with retry logic
         
         Args:
             user_id: User identifier
             
         Returns:
-            Dictionary with user information or None if failed
+            Undecoded JSON response body or None if failed
         """
-        async with self.get_session() as session:
-            try:
-                url = f"{self.base_url}/users/{user_id}"
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data
-                    elif response.status == 404:
-                        logger.warning(f"User {user_id} not found in API")
-                        return None
-                    else:
-                        logger.error(f"API error for user {user_id}: {response.status}")
-                        response.raise_for_status()
-            except aiohttp.ClientError as e:
-                logger.error(f"API request failed for user {user_id}: {e}")
-                raise
-            except Exception as e:
-                logger.error(f"Unexpected error for user {user_id}: {e}")
-                return None
\ No newline at end of file
+        if self._client is None:
+            raise RuntimeError("API client is not started; call start() first")
+        try:
+            url = f"{self.base_url}/users/{user_id}"
+            # Rate limiting; taken per attempt so retries stay within budget
+            async with self.limiter:
+                response = await self._client.get(url)
+            if response.status_code == 200:
+                return response.content
+            elif response.status_code == 404:
+                logger.warning(f"User {user_id} not found in API")
+                return None
+            elif response.status_code in (429, 503):
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                logger.warning(f"API throttled user {user_id}, "
+                               f"retrying after {retry_after}s")
+                raise RateLimited(retry_after)
+            else:
+                logger.error(f"API error for user {user_id}: {response.status_code}")
+                response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.error(f"API request failed for user {user_id}: {e}")
+            raise
+        except RateLimited:
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error for user {user_id}: {e}")
+            return None
\ No newline at end of file
@@ -25,8 +25,13 @@ class Config:
     
     # Performance settings
     CONCURRENT_REQUESTS = int(os.getenv("CONCURRENT_REQUESTS", "20"))
-    BATCH_SIZE = int(os.getenv("BATCH_SIZE", "100"))
-    REQUEST_DELAY = float(os.getenv("REQUEST_DELAY", "0.1"))
+    CONNECTION_POOL_SIZE = int(os.getenv("CONNECTION_POOL_SIZE", "200"))
+    BATCH_SIZE = int(os.getenv("BATCH_SIZE", "1000"))
+    API_BATCH_SIZE = int(os.getenv("API_BATCH_SIZE", "500"))
+    DB_CONCURRENCY = int(os.getenv("DB_CONCURRENCY", "4"))
+    STALE_AFTER_SECONDS = int(os.getenv("STALE_AFTER_SECONDS", "0"))
+    PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0"))
+    REQUESTS_PER_SECOND = float(os.getenv("REQUESTS_PER_SECOND", "100"))
     
     # Logging
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -1,16 +1,23 @@
 """Database management module"""
 
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from datetime import datetime
+from typing import AsyncIterator, List, Dict, Any, Optional
 
-from pymongo import AsyncMongoClient
-from pymongo.errors import PyMongoError
+from pymongo import AsyncMongoClient, UpdateOne
+from pymongo.errors import OperationFailure, PyMongoError
 
 from models import UserUpdate
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# MongoDB splits bulk writes into server batches of at most 1000 operations
+MONGO_MAX_BATCH = min(Config.BATCH_SIZE, 1000)
+
+_USER_PROJECTION = {"_id": 1, "user_id": 1, "phone_number": 1, "city": 1, "state": 1}
+
 
 class DatabaseManager:
     """Manages MongoDB connections and operations using native async PyMongo"""
@@ -21,6 +28,7 @@ class DatabaseManager:
         self.collection_name = collection_name
         self.client: Optional[AsyncMongoClient] = None
         self.collection = None
+        self._write_semaphore = asyncio.Semaphore(Config.DB_CONCURRENCY)
     
     async def connect(self):
         """Establish database connection"""
@@ -29,31 +37,82 @@ class DatabaseManager:
             # Verify connection
             await self.client.admin.command('ping')
             self.collection = self.client[self.db_name][self.collection_name]
+            await self._ensure_user_id_index()
             logger.info("Successfully connected to MongoDB")
         except PyMongoError as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise
     
+    async def _ensure_user_id_index(self):
+        """Index user_id so bulk updates avoid a collection scan per op"""
+        try:
+            indexes = await self.collection.index_information()
+            if any(info["key"][0][0] == "user_id" for info in indexes.values()):
+                return
+            await self.collection.create_index("user_id")
+        except OperationFailure as e:
+            logger.warning(f"Could not create user_id index, bulk updates "
+                           f"may be slow: {e}")
+    
     async def disconnect(self):
         """Close database connection"""
         if self.client:
             self.client.close()
             logger.info("MongoDB connection closed")
     
-    async def get_all_users(self) -> List[Dict[str, Any]]:
-        """Fetch all users from the collection"""
+    async def iter_users(
+        self,
+        batch_size: int = 1000,
+        stale_before: Optional[datetime] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream users from the collection using a server-side cursor
+        
+        Args:
+            batch_size: Number of documents per cursor batch
+            stale_before: Only yield users last synced before this time
+                (or never synced); all users when None
+        """
+        query = {}
+        if stale_before is not None:
+            query = {"$or": [
+                {"last_synced": {"$lt": stale_before}},
+                {"last_synced": None}
+            ]}
         try:
-            cursor = self.collection.find(
-                {}, 
-                {"_id": 1, "user_id": 1, "phone_number": 1, "city": 1, "state": 1}
-            )
-            users = await cursor.to_list(length=None)
-            logger.info(f"Retrieved {len(users)} users from database")
-            return users
+            cursor = self.collection.find(query, _USER_PROJECTION).batch_size(batch_size)
+            count = 0
+            async for doc in cursor:
+                count += 1
+                yield doc
+            logger.info(f"Retrieved {count} users from database")
         except PyMongoError as e:
             logger.error(f"Error fetching users: {e}")
             raise
     
+    async def _write_batch(self, batch: List[UpdateOne], batch_number: int) -> int:
+        """Send one unordered bulk write, bounded by the write semaphore"""
+        async with self._write_semaphore:
+            result = await self.collection.bulk_write(batch, ordered=False)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Processed batch %s: %s modified",
+                         batch_number, result.modified_count)
+        return result.modified_count
+    
+    async def touch_users(self, user_ids: List[str], synced_at: datetime) -> int:
+        """Stamp last_synced on users whose data was checked and unchanged"""
+        if not user_ids:
+            return 0
+        try:
+            async with self._write_semaphore:
+                result = await self.collection.update_many(
+                    {"user_id": {"$in": user_ids}},
+                    {"$set": {"last_synced": synced_at}}
+                )
+            return result.modified_count
+        except PyMongoError as e:
+            logger.error(f"Error stamping last_synced: {e}")
+            raise
+    
     async def bulk_update_users(self, updates: List[UserUpdate]) -> int:
         """Perform bulk updates on user records"""
         if not updates:
@@ -61,40 +120,58 @@ class DatabaseManager:
         
         operations = []
         for update in updates:
-            update_doc = {
-                "$set": {
-                    "last_synced": update.last_synced
-                }
-            }
+            set_doc = {}
             
             if update.phone_number is not None:
-                update_doc["$set"]["phone_number"] = update.phone_number
+                set_doc["phone_number"] = update.phone_number
             if update.city is not None:
-                update_doc["$set"]["city"] = update.city
+                set_doc["city"] = update.city
             if update.state is not None:
-                update_doc["$set"]["state"] = update.state
+                set_doc["state"] = update.state
+            
+            if not set_doc:
+                # Nothing to write; still record that the user was checked
+                operations.append(
+                    UpdateOne(
+                        {"user_id": update.user_id},
+                        {"$set": {"last_synced": update.last_synced}},
+                        upsert=False
+                    )
+                )
+                continue
+            
+            # Only match documents where at least one field differs
+            changed = [{field: {"$ne": value}} for field, value in set_doc.items()]
+            set_doc["last_synced"] = update.last_synced
             
-            operations.append({
-                "update_one": {
-                    "filter": {"user_id": update.user_id},
-                    "update": update_doc,
-                    "upsert": False
-                }
-            })
+            operations.append(
+                UpdateOne(
+                    {"user_id": update.user_id, "$or": changed},
+                    {"$set": set_doc},
+                    upsert=False
+                )
+            )
+        
+        if not operations:
+            return 0
         
         try:
-            # Process in batches to avoid memory issues
-            total_modified = 0
-            batch_size = Config.BATCH_SIZE
-            
-            for i in range(0, len(operations), batch_size):
-                batch = operations[i:i + batch_size]
-                result = await self.collection.bulk_write(batch, ordered=False)
-                total_modified += result.modified_count
-                logger.debug(f"Processed batch {i//batch_size + 1}: "
-                           f"{result.modified_count} modified")
+            # Send batches concurrently; unordered writes are independent
+            batch_size = MONGO_MAX_BATCH
+            tasks = [
+                self._write_batch(operations[i:i + batch_size], i // batch_size + 1)
+                for i in range(0, len(operations), batch_size)
+            ]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            total_modified = sum(r for r in results if not isinstance(r, BaseException))
+            failures = [r for r in results if isinstance(r, BaseException)]
+            if failures:
+                logger.error(f"{len(failures)} of {len(tasks)} bulk write batches failed; "
+                             f"{total_modified} records updated before the failure")
+                raise failures[0]
             
-            logger.info(f"Updated {total_modified} user records")
+            logger.info(f"Updated {total_modified} user records "
+                        f"({len(operations) - total_modified} unchanged)")
             return total_modified
         except PyMongoError as e:
             logger.error(f"Error performing bulk update: {e}")
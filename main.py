@@ -38,8 +38,9 @@ async def main():
             timeout=Config.API_TIMEOUT
         )
         
-        # Connect to database
+        # Connect to database and open the API session
         await db_manager.connect()
+        await api_client.start()
         
         # Create sync service
         sync_service = UserSyncService(db_manager, api_client)
@@ -53,6 +54,7 @@ async def main():
         print(f"{'='*50}")
         print(f"Total Users: {stats['total_users']}")
         print(f"Users Checked: {stats['users_checked']}")
+        print(f"Users Skipped: {stats['users_skipped']}")
         print(f"Users Updated: {stats['users_updated']}")
         print(f"Errors: {stats['errors']}")
         print(f"Duration: {stats['duration_seconds']:.2f} seconds")
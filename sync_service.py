@@ -2,8 +2,12 @@
 
 import asyncio
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+
+import orjson
 
 from models import UserUpdate
 from database import DatabaseManager
@@ -12,6 +16,35 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
+_SYNC_FIELDS = ("phone_number", "city", "state")
+
+# Returned by _parse_and_diff when the API values match the stored ones
+_UNCHANGED = ()
+
+
+def _parse_and_diff(raw: bytes, current: Tuple) -> Optional[Tuple]:
+    """
+    Decode an API payload and compare it with the stored values
+    
+    Module-level so it can be pickled into a ProcessPoolExecutor.
+    
+    Null API fields are never written, so they do not count as changes.
+    
+    Returns:
+        The API (phone_number, city, state) tuple if it differs, _UNCHANGED if
+        it matches, None if the payload is empty
+    """
+    api_data = orjson.loads(raw)
+    if not api_data:
+        return None
+    fields = tuple(map(api_data.get, _SYNC_FIELDS))
+    if fields == current:
+        return _UNCHANGED
+    for value, stored in zip(fields, current):
+        if value is not None and value != stored:
+            return fields
+    return _UNCHANGED
+
 
 class UserSyncService:
     """Orchestrates the user synchronization process"""
@@ -19,57 +52,127 @@ class UserSyncService:
     def __init__(self, db_manager: DatabaseManager, api_client: ExternalAPIClient):
         self.db_manager = db_manager
         self.api_client = api_client
-        self.semaphore = asyncio.Semaphore(Config.CONCURRENT_REQUESTS)
+        # Snapshot configuration so hot paths avoid repeated Config lookups
+        self._concurrency = Config.CONCURRENT_REQUESTS
+        self._api_batch_size = Config.API_BATCH_SIZE
+        self._parse_workers = Config.PARSE_WORKERS
+        self._stale_after = Config.STALE_AFTER_SECONDS
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: List[UserUpdate] = []
+        self._pending_lock = asyncio.Lock()
+        self._write_tasks: List[asyncio.Task] = []
+        self._touched: List[str] = []
+        self._touch_tasks: List[asyncio.Task] = []
     
-    async def fetch_and_prepare_update(self, user: Dict[str, Any]) -> Optional[UserUpdate]:
+    @staticmethod
+    def _needs_sync(user: Dict[str, Any]) -> bool:
+        """
+        Cheap local screen run before spending an API request on a user
+        
+        Bulk updates match on user_id, so a document without one can never
+        be updated and its API round trip would be wasted.
+        """
+        return bool(user.get("user_id"))
+    
+    async def fetch_and_prepare_update(
+        self, user: Dict[str, Any], now: datetime
+    ) -> Optional[UserUpdate]:
         """
         Fetch user data from API and prepare update object
         
         Args:
             user: User document from MongoDB
+            now: Sync timestamp recorded as last_synced
             
         Returns:
             UserUpdate object if changes detected, None otherwise
+            
+        Raises:
+            Exception: API or decode failures, after logging, so the caller
+                counts them as errors
         """
-        async with self.semaphore:
-            user_id = user.get("user_id") or str(user.get("_id"))
+        user_id = user["user_id"]
+        
+        try:
+            raw = await self.api_client.get_user_raw(user_id)
             
-            # Rate limiting
-            await asyncio.sleep(Config.REQUEST_DELAY)
+            if raw is None:
+                return None
             
-            try:
-                api_data = await self.api_client.get_user_info(user_id)
-                
-                if not api_data:
-                    return None
-                
-                # Check if any fields have changed
-                current_phone = user.get("phone_number")
-                current_city = user.get("city")
-                current_state = user.get("state")
-                
-                api_phone = api_data.get("phone_number")
-                api_city = api_data.get("city")
-                api_state = api_data.get("state")
-                
-                if (current_phone != api_phone or 
-                    current_city != api_city or 
-                    current_state != api_state):
-                    
-                    logger.debug(f"Changes detected for user {user_id}")
-                    return UserUpdate(
-                        user_id=user_id,
-                        phone_number=api_phone,
-                        city=api_city,
-                        state=api_state,
-                        last_synced=datetime.utcnow()
-                    )
-                
+            # Single tuple compare; the bulk update re-checks server-side
+            current = tuple(map(user.get, _SYNC_FIELDS))
+            if self._executor is None:
+                changed = _parse_and_diff(raw, current)
+            else:
+                changed = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, _parse_and_diff, raw, current
+                )
+            if changed is None:
                 return None
-                
-            except Exception as e:
-                logger.error(f"Error processing user {user_id}: {e}")
+            if changed == _UNCHANGED:
+                # Stamp last_synced so the staleness filter skips this user
+                if self._stale_after > 0:
+                    await self._queue_touch(user_id, now)
                 return None
+            phone, city, state = changed
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Changes detected for user %s", user_id)
+            return UserUpdate(
+                user_id=user_id,
+                phone_number=phone,
+                city=city,
+                state=state,
+                last_synced=now
+            )
+            
+        except Exception as e:
+            logger.error(f"Error processing user {user_id}: {e}")
+            raise
+    
+    async def _queue_update(self, update: UserUpdate):
+        """Buffer an update and flush a full batch in the background"""
+        async with self._pending_lock:
+            self._pending.append(update)
+            if len(self._pending) < self._api_batch_size:
+                return
+            batch, self._pending = self._pending, []
+        self._write_tasks.append(
+            asyncio.create_task(self.db_manager.bulk_update_users(batch))
+        )
+    
+    async def _queue_touch(self, user_id: str, now: datetime):
+        """Buffer an unchanged user and stamp a full batch in the background"""
+        async with self._pending_lock:
+            self._touched.append(user_id)
+            if len(self._touched) < self._api_batch_size:
+                return
+            user_ids, self._touched = self._touched, []
+        self._touch_tasks.append(
+            asyncio.create_task(self.db_manager.touch_users(user_ids, now))
+        )
+    
+    async def _flush_pending(self, now: datetime) -> int:
+        """Write any buffered updates and wait for in-flight writes"""
+        async with self._pending_lock:
+            batch, self._pending = self._pending, []
+            user_ids, self._touched = self._touched, []
+        if batch:
+            self._write_tasks.append(
+                asyncio.create_task(self.db_manager.bulk_update_users(batch))
+            )
+        if user_ids:
+            self._touch_tasks.append(
+                asyncio.create_task(self.db_manager.touch_users(user_ids, now))
+            )
+        write_tasks, self._write_tasks = self._write_tasks, []
+        touch_tasks, self._touch_tasks = self._touch_tasks, []
+        # Wait for every write before surfacing the first failure
+        results = await asyncio.gather(*write_tasks, *touch_tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return sum(results[:len(write_tasks)])
     
     async def sync_users(self) -> Dict[str, Any]:
         """
@@ -78,38 +181,82 @@ class UserSyncService:
         Returns:
             Dictionary with sync statistics
         """
-        start_time = datetime.utcnow()
+        if not self.api_client.is_started:
+            raise RuntimeError("API client is not started; call start() first")
+        
+        # One timestamp per run, shared by every update as last_synced
+        now = datetime.now(timezone.utc)
         logger.info("Starting user synchronization")
         
+        # Decode and diff in worker processes when configured for huge syncs
+        if self._parse_workers > 0:
+            # forkserver avoids forking live pymongo/httpx state and threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._parse_workers,
+                mp_context=multiprocessing.get_context("forkserver")
+            )
+        
         try:
-            # Fetch all users
-            users = await self.db_manager.get_all_users()
-            total_users = len(users)
+            queue: asyncio.Queue = asyncio.Queue(maxsize=self._concurrency * 4)
+            total_users = 0
+            checked = 0
+            skipped = 0
+            errors = 0
             
-            # Process users concurrently
-            tasks = [self.fetch_and_prepare_update(user) for user in users]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            # Restrict the scan to users not synced within the refresh window
+            stale_before = None
+            if self._stale_after > 0:
+                stale_before = now - timedelta(seconds=self._stale_after)
             
-            # Filter out None values and exceptions
-            updates = [
-                result for result in results 
-                if isinstance(result, UserUpdate)
-            ]
+            async def produce():
+                nonlocal total_users
+                async for user in self.db_manager.iter_users(stale_before=stale_before):
+                    total_users += 1
+                    await queue.put(user)
+                # One sentinel per worker signals the end of the stream
+                for _ in range(self._concurrency):
+                    await queue.put(None)
+            
+            async def consume():
+                nonlocal checked, skipped, errors
+                while (user := await queue.get()) is not None:
+                    if not self._needs_sync(user):
+                        skipped += 1
+                        continue
+                    try:
+                        result = await self.fetch_and_prepare_update(user, now)
+                        if isinstance(result, UserUpdate):
+                            await self._queue_update(result)
+                        checked += 1
+                    except Exception:
+                        errors += 1
+            
+            # Stream users from the database while a fixed pool of workers
+            # calls the API; the pool size bounds concurrency, so no semaphore
+            # is needed, and a failing producer cancels the whole group
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    tg.create_task(produce())
+                    for _ in range(self._concurrency):
+                        tg.create_task(consume())
+            except ExceptionGroup as eg:
+                # Surface a lone failure (e.g. PyMongoError) with its own type
+                if len(eg.exceptions) == 1:
+                    raise eg.exceptions[0]
+                raise
             
-            # Perform bulk update
-            modified_count = 0
-            if updates:
-                modified_count = await self.db_manager.bulk_update_users(updates)
+            # Flush the remaining updates and wait for background writes
+            modified_count = await self._flush_pending(now)
             
             # Calculate statistics
-            duration = (datetime.utcnow() - start_time).total_seconds()
-            errors_count = len([r for r in results if isinstance(r, Exception)])
+            duration = (datetime.now(timezone.utc) - now).total_seconds()
             
             stats = {
                 "total_users": total_users,
-                "users_checked": len([r for r in results if not isinstance(r, Exception)]),
+                "users_checked": checked,
+                "users_skipped": skipped,
                 "users_updated": modified_count,
-                "errors": errors_count,
+                "errors": errors,
                 "duration_seconds": duration
             }
             
@@ -118,4 +265,16 @@ class UserSyncService:
             
         except Exception as e:
             logger.error(f"Synchronization failed: {e}")
-            raise
\ No newline at end of file
+            raise
+        finally:
+            # Never leave background writes running past this call
+            in_flight = self._write_tasks + self._touch_tasks
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            self._write_tasks = []
+            self._touch_tasks = []
+            self._pending = []
+            self._touched = []
+            if self._executor is not None:
+                executor, self._executor = self._executor, None
+                await asyncio.to_thread(executor.shutdown, cancel_futures=True)
\ No newline at end of file